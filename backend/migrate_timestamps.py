@@ -0,0 +1,49 @@
+"""One-off migration: convert ISO-string timestamps to native BSON dates.
+
+Documents written before the switch to native BSON dates stored
+created_at/submitted_at as ISO strings, which breaks server-side sorting
+against newer documents. Run once against the live database:
+
+    python migrate_timestamps.py
+"""
+import asyncio
+import os
+from datetime import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+from pymongo import AsyncMongoClient
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+
+async def migrate_field(collection, field: str) -> int:
+    """Convert string values of `field` to datetime; returns converted count."""
+    converted = 0
+    async for doc in collection.find({field: {"$type": "string"}}, {"_id": 1, field: 1}):
+        await collection.update_one(
+            {"_id": doc["_id"]},
+            {"$set": {field: datetime.fromisoformat(doc[field])}},
+        )
+        converted += 1
+    return converted
+
+
+async def main():
+    client = AsyncMongoClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        for collection, field in (
+            (db.users, "created_at"),
+            (db.exams, "created_at"),
+            (db.exam_results, "submitted_at"),
+        ):
+            converted = await migrate_field(collection, field)
+            print(f"{collection.name}.{field}: converted {converted} document(s)")
+    finally:
+        await client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
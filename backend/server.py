@@ -1,8 +1,12 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, File, UploadFile, Form, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, File, UploadFile, Form, Query, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from bson import ObjectId
+from gridfs import AsyncGridFSBucket
+from pymongo import AsyncMongoClient
+from pymongo.errors import DuplicateKeyError
 import os
 import logging
 from pathlib import Path
@@ -11,35 +15,168 @@ from typing import List, Optional, Literal
 import uuid
 from datetime import datetime, timezone, timedelta
 import jwt
+import orjson
+from cachetools import TTLCache
 from passlib.context import CryptContext
 import tempfile
-from PyPDF2 import PdfReader
 import google.generativeai as genai
 from pdf2image import convert_from_path
 from PIL import Image
-import base64
+import asyncio
+try:
+    # SIMD-accelerated drop-in replacement; output is byte-identical
+    import pybase64 as base64
+except ImportError:
+    import base64
+import hashlib
 import io
 import random
+import re
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncMongoClient(
+    mongo_url,
+    maxPoolSize=50,
+    minPoolSize=10,
+    # Base64 image payloads compress well; ignored if the server lacks
+    # zstd support
+    compressors="zstd",
+    serverSelectionTimeoutMS=5000,
+    socketTimeoutMS=30000,
+    retryWrites=True,
+)
 db = client[os.environ['DB_NAME']]
+# Question images live in GridFS, not inside the exam documents
+fs_bucket = AsyncGridFSBucket(db)
 
 # Security
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=10)
 SECRET_KEY = os.environ.get("SECRET_KEY", "exam-generator-secret-key-2025")
 ALGORITHM = "HS256"
 security = HTTPBearer()
 
+# Short-lived cache of authenticated users so hot users skip the Mongo
+# round-trip in get_current_user
+_USER_CACHE: TTLCache = TTLCache(maxsize=4096, ttl=60)
+
+# Token-digest to user mapping; repeat requests bearing the same token skip
+# the JWT decode as well. The 60s TTL is far below token lifetime, so an
+# expiring token is re-checked well before it matters.
+_TOKEN_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+
+# Recently verified credential digests, so rapid repeat logins skip the
+# deliberately slow bcrypt check
+_LOGIN_CACHE: TTLCache = TTLCache(maxsize=1024, ttl=30)
+
 # Google AI Key
 GOOGLE_AI_KEY = os.environ.get("GOOGLE_AI_KEY")
 
+# Gemini models to try, in preference order. Flash first: for fixed-schema
+# question generation it is several times faster than Pro at comparable
+# output quality.
+GEMINI_MODEL_NAMES = ['gemini-2.5-flash', 'gemini-2.5-pro', 'gemini-2.0-flash', 'gemini-pro-latest']
+_GEMINI_MODEL = None
+
+_QUESTIONS_SCHEMA = genai.protos.Schema(
+    type=genai.protos.Type.ARRAY,
+    items=genai.protos.Schema(
+        type=genai.protos.Type.OBJECT,
+        properties={
+            "question_text": genai.protos.Schema(type=genai.protos.Type.STRING),
+            "question_type": genai.protos.Schema(type=genai.protos.Type.STRING),
+            "options": genai.protos.Schema(
+                type=genai.protos.Type.ARRAY,
+                items=genai.protos.Schema(type=genai.protos.Type.STRING),
+            ),
+            "correct_answer": genai.protos.Schema(type=genai.protos.Type.STRING),
+            "explanation": genai.protos.Schema(type=genai.protos.Type.STRING),
+        },
+        required=["question_text", "question_type", "correct_answer"],
+    ),
+)
+
+# Structured-output config for text-based question generation: the model
+# returns the JSON array directly, with no markdown fence to strip
+_QUESTIONS_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": _QUESTIONS_SCHEMA,
+}
+
+# Explicit Gemini context caches keyed by a digest of the PDF text, so
+# regenerating exams from the same document does not re-send the content.
+# The local TTL sits below the remote CachedContent TTL (1h) so a handle is
+# never returned after its server-side cache has expired
+_CONTEXT_CACHE: TTLCache = TTLCache(maxsize=32, ttl=3300)
+_CONTEXT_CACHE_MIN_CHARS = 16000  # roughly Gemini's 4096-token cache minimum
+_CONTEXT_CACHE_MODEL = "models/gemini-2.5-flash"
+
+async def _get_context_cache(pdf_text: str):
+    """Return a CachedContent handle for this PDF text, creating it on first use.
+
+    Returns None when the text is too short to qualify for explicit caching
+    or creation fails; callers then fall back to inline content. The TTLCache
+    is only touched here on the event loop — cachetools is not thread-safe —
+    and just the blocking create call runs in a thread.
+    """
+    if len(pdf_text) < _CONTEXT_CACHE_MIN_CHARS:
+        return None
+
+    digest = hashlib.sha256(pdf_text.encode()).hexdigest()
+    cached = _CONTEXT_CACHE.get(digest)
+    if cached is not None:
+        return cached
+
+    try:
+        from google.generativeai import caching
+
+        cached = await asyncio.to_thread(
+            caching.CachedContent.create,
+            model=_CONTEXT_CACHE_MODEL,
+            display_name=f"exam-pdf-{digest[:12]}",
+            system_instruction=(
+                "Sen uzman bir sınav oluşturucususun. Sana sağlanan belge içeriğine "
+                "dayalı olarak yüksek kaliteli sınav soruları oluştur."
+            ),
+            contents=[pdf_text],
+            ttl=timedelta(hours=1),
+        )
+    except Exception as e:
+        logging.warning(f"Context cache creation failed: {str(e)}")
+        return None
+
+    _CONTEXT_CACHE[digest] = cached
+    return cached
+
+# Optional ```json ... ``` fence around model output
+_FENCE_RE = re.compile(r"^```(?:json)?\s*\n?(.*?)\n?```\s*$", re.S)
+
+def _strip_markdown_fence(text: str) -> str:
+    """Remove a surrounding markdown code fence from model output, if any."""
+    match = _FENCE_RE.match(text)
+    return match.group(1) if match else text
+
+def _get_gemini_model():
+    """Return the shared GenerativeModel, constructing it on first use."""
+    global _GEMINI_MODEL
+    if _GEMINI_MODEL is None:
+        for model_name in GEMINI_MODEL_NAMES:
+            try:
+                _GEMINI_MODEL = genai.GenerativeModel(model_name)
+                logging.info(f"Successfully created model: {model_name}")
+                break
+            except Exception as e:
+                logging.warning(f"Failed to create model {model_name}: {e}")
+                continue
+    if _GEMINI_MODEL is None:
+        raise HTTPException(status_code=500, detail="No available Gemini models found")
+    return _GEMINI_MODEL
+
 # Create the main app
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 api_router = APIRouter(prefix="/api")
 
 # Models
@@ -66,7 +203,7 @@ class Question(BaseModel):
     options: Optional[List[str]] = None
     correct_answer: str
     explanation: Optional[str] = None
-    image_data: Optional[str] = None  # Base64 encoded image
+    image_data: Optional[str] = None  # uuid4 name of the GridFS question image (served by /images/{id})
 
 class ExamCreate(BaseModel):
     exam_type: Literal["multiple_choice", "true_false", "fill_blank", "open_ended", "image_based", "mixed"]
@@ -84,6 +221,18 @@ class Exam(BaseModel):
     pdf_name: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class ExamSummary(BaseModel):
+    """List-view projection of an Exam without the heavy questions array."""
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    user_id: str
+    title: str
+    exam_type: str
+    difficulty: str
+    pdf_name: Optional[str] = None
+    created_at: datetime
+    question_count: int = 0
+
 class ExamAnswer(BaseModel):
     question_id: str
     user_answer: str
@@ -100,8 +249,9 @@ class ExamResult(BaseModel):
     score: float
     total_questions: int
     correct_answers: int
-    answers: List[ExamAnswer]
-    feedback: List[dict]
+    # Default to empty so list views can project the per-answer detail out
+    answers: List[ExamAnswer] = Field(default_factory=list)
+    feedback: List[dict] = Field(default_factory=list)
     submitted_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 # Helper Functions
@@ -120,13 +270,21 @@ def create_access_token(data: dict, expires_delta: timedelta = timedelta(days=7)
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
     try:
         token = credentials.credentials
+        token_key = hashlib.sha256(token.encode()).digest()
+        cached_user = _TOKEN_CACHE.get(token_key)
+        if cached_user is not None:
+            return cached_user
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid authentication")
-        user = await db.users.find_one({"id": user_id}, {"_id": 0})
+        user = _USER_CACHE.get(user_id)
         if user is None:
-            raise HTTPException(status_code=401, detail="User not found")
+            user = await db.users.find_one({"id": user_id}, {"_id": 0})
+            if user is None:
+                raise HTTPException(status_code=401, detail="User not found")
+            _USER_CACHE[user_id] = user
+        _TOKEN_CACHE[token_key] = user
         return user
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
@@ -135,18 +293,23 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
 
 def extract_text_from_pdf(pdf_path: str) -> str:
     """Extract text from PDF file"""
-    reader = PdfReader(pdf_path)
-    text = ""
-    for page in reader.pages:
-        text += page.extract_text()
-    return text
+    import fitz  # PyMuPDF
+
+    doc = fitz.open(pdf_path)
+    try:
+        # Separate pages with a form feed so page boundaries stay visible
+        return "\f".join(page.get_text() for page in doc)
+    finally:
+        doc.close()
+
+# Maximum pixel dimension for extracted page images
+MAX_IMAGE_SIZE = 1024
 
 def _pil_image_to_base64(img: Image.Image) -> str:
     """Normalize a PIL image and return a base64-encoded JPEG string."""
-    max_size = 1024
     img = img.convert("RGB")
-    if img.width > max_size or img.height > max_size:
-        img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    if img.width > MAX_IMAGE_SIZE or img.height > MAX_IMAGE_SIZE:
+        img.thumbnail((MAX_IMAGE_SIZE, MAX_IMAGE_SIZE), Image.Resampling.LANCZOS)
 
     buffer = io.BytesIO()
     img.save(buffer, format="JPEG", quality=85)
@@ -155,29 +318,45 @@ def _pil_image_to_base64(img: Image.Image) -> str:
 
 def _extract_images_with_pdf2image(pdf_path: str, target_count: int) -> List[dict]:
     try:
-        pages = convert_from_path(pdf_path, dpi=200, fmt="jpeg")
-        if not pages:
-            return []
-
-        if len(pages) < target_count:
-            logging.warning(
-                "pdf2image produced %s pages, fewer than requested %s questions",
-                len(pages),
-                target_count,
+        with tempfile.TemporaryDirectory() as tmpdir:
+            page_paths = convert_from_path(
+                pdf_path,
+                dpi=150,
+                fmt="jpeg",
+                thread_count=max(1, (os.cpu_count() or 1) - 1),
+                output_folder=tmpdir,
+                paths_only=True,
             )
-            return []
+            if not page_paths:
+                return []
+
+            if len(page_paths) < target_count:
+                logging.warning(
+                    "pdf2image produced %s pages, fewer than requested %s questions",
+                    len(page_paths),
+                    target_count,
+                )
+                return []
 
-        selected_indices = random.sample(range(len(pages)), target_count)
-        logging.info("Selected pages via pdf2image: %s", sorted(selected_indices))
+            selected_indices = random.sample(range(len(page_paths)), target_count)
+            logging.info("Selected pages via pdf2image: %s", sorted(selected_indices))
 
-        extracted = []
-        for page_index in selected_indices:
-            extracted.append({
-                "page_index": page_index,
-                "image_data": _pil_image_to_base64(pages[page_index])
-            })
+            extracted = []
+            for page_index in selected_indices:
+                page_path = page_paths[page_index]
+                with Image.open(page_path) as img:
+                    if img.width <= MAX_IMAGE_SIZE and img.height <= MAX_IMAGE_SIZE:
+                        # Already a small JPEG on disk: reuse the bytes as-is
+                        with open(page_path, "rb") as f:
+                            image_data = base64.b64encode(f.read()).decode()
+                    else:
+                        image_data = _pil_image_to_base64(img)
+                extracted.append({
+                    "page_index": page_index,
+                    "image_data": image_data
+                })
 
-        return extracted
+            return extracted
     except Exception as e:
         logging.error(f"Error extracting images using pdf2image: {str(e)}")
         return []
@@ -208,15 +387,20 @@ def extract_images_from_pdf(pdf_path: str, target_count: int) -> List[dict]:
             selected_indices = random.sample(range(total_pages), target_count)
             logging.info("Selected pages via PyMuPDF: %s", sorted(selected_indices))
 
-            zoom_matrix = fitz.Matrix(2.0, 2.0)
+            zoom_matrix = fitz.Matrix(150 / 72, 150 / 72)  # render at 150 DPI
             extracted = []
             for page_index in selected_indices:
                 page = doc[page_index]
                 pix = page.get_pixmap(matrix=zoom_matrix)
-                img = Image.open(io.BytesIO(pix.tobytes("png")))
+                if pix.width <= MAX_IMAGE_SIZE and pix.height <= MAX_IMAGE_SIZE:
+                    # Already JPEG and small enough: encode the raw bytes directly
+                    image_data = base64.b64encode(pix.tobytes("jpeg", jpg_quality=85)).decode()
+                else:
+                    img = Image.open(io.BytesIO(pix.tobytes("jpeg", jpg_quality=85)))
+                    image_data = _pil_image_to_base64(img)
                 extracted.append({
                     "page_index": page_index,
-                    "image_data": _pil_image_to_base64(img)
+                    "image_data": image_data
                 })
 
             return extracted
@@ -238,6 +422,66 @@ def extract_images_from_pdf(pdf_path: str, target_count: int) -> List[dict]:
 
     return images
 
+async def _stream_page_images(pdf_path: str, target_count: int, render_q: asyncio.Queue) -> None:
+    """Producer stage: render selected PDF pages one at a time into render_q.
+
+    Each page is rendered on a worker thread and queued as soon as it is
+    ready, so the consumer can already be talking to the model while the
+    next page rasterizes. Always terminates the queue with a None sentinel.
+    """
+    pushed = 0
+    try:
+        try:
+            import fitz  # PyMuPDF
+
+            doc = await asyncio.to_thread(fitz.open, pdf_path)
+            try:
+                total_pages = len(doc)
+                if total_pages == 0:
+                    raise HTTPException(status_code=400, detail="PDF does not contain any pages")
+
+                if total_pages < target_count:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=(
+                            f"PDF contains only {total_pages} pages, cannot create {target_count} image-based questions."
+                        ),
+                    )
+
+                selected_indices = random.sample(range(total_pages), target_count)
+                logging.info("Selected pages via PyMuPDF: %s", sorted(selected_indices))
+
+                zoom_matrix = fitz.Matrix(150 / 72, 150 / 72)  # render at 150 DPI
+
+                def _render(page_index: int) -> str:
+                    pix = doc[page_index].get_pixmap(matrix=zoom_matrix)
+                    if pix.width <= MAX_IMAGE_SIZE and pix.height <= MAX_IMAGE_SIZE:
+                        return base64.b64encode(pix.tobytes("jpeg", jpg_quality=85)).decode()
+                    img = Image.open(io.BytesIO(pix.tobytes("jpeg", jpg_quality=85)))
+                    return _pil_image_to_base64(img)
+
+                for page_index in selected_indices:
+                    image_data = await asyncio.to_thread(_render, page_index)
+                    await render_q.put({"page_index": page_index, "image_data": image_data})
+                    pushed += 1
+                return
+            finally:
+                doc.close()
+        except HTTPException:
+            raise
+        except ImportError:
+            logging.warning("PyMuPDF is not available, falling back to bulk extraction")
+        except Exception as e:
+            if pushed:
+                raise
+            logging.warning(f"Streaming page render failed: {str(e)}. Falling back to bulk extraction.")
+
+        for item in await asyncio.to_thread(extract_images_from_pdf, pdf_path, target_count):
+            await render_q.put(item)
+    finally:
+        await render_q.put(None)
+
+
 def get_random_pdf_sections(pdf_text: str, num_sections: int = 3) -> str:
     """Get random sections from PDF text for more diverse questions"""
     try:
@@ -259,40 +503,20 @@ def get_random_pdf_sections(pdf_text: str, num_sections: int = 3) -> str:
 async def generate_image_based_exam(pdf_path: str, difficulty: str, num_questions: int) -> List[Question]:
     """Generate image-based exam questions using AI with page-level visual analysis."""
     try:
-        images = extract_images_from_pdf(pdf_path, num_questions)
-
-        genai.configure(api_key=GOOGLE_AI_KEY)
-
         difficulty_turkish = {
             "easy": "kolay",
             "medium": "orta",
             "hard": "zor",
         }.get(difficulty, difficulty)
 
-        model_names_to_try = ['gemini-2.5-pro', 'gemini-2.5-flash', 'gemini-2.0-flash', 'gemini-pro-latest']
-        model = None
-
-        for model_name in model_names_to_try:
-            try:
-                model = genai.GenerativeModel(model_name)
-                logging.info(f"Successfully created model for images: {model_name}")
-                break
-            except Exception as e:
-                logging.warning(f"Failed to create model {model_name}: {e}")
-                continue
-
-        if not model:
-            raise HTTPException(status_code=500, detail="No available Gemini models found for image processing")
-
-        questions: List[Question] = []
-        import json
+        model = _get_gemini_model()
 
-        for idx, page_image in enumerate(images):
+        async def _question_for_page(page_image: dict) -> Question:
             prompt = f"""Sen uzman bir sınav oluşturucususun. Sana verilen görseli analiz ederek {difficulty_turkish} zorluk seviyesinde SADECE bir adet görsel tabanlı çoktan seçmeli sınav sorusu üret.
 
 Kurallar:
 - Soru ve seçenekler görseldeki içerikten türetilmeli, görselde yer almayan bilgileri kullanma.
-- Soru metninde "Görsel {idx}" gibi ifadeler kullanma; görseldeki unsurları betimleyerek anlat.
+- Soru metninde "Görsel 1" gibi ifadeler kullanma; görseldeki unsurları betimleyerek anlat.
 - 5 seçenek (A, B, C, D, E) oluştur ve her birini görsele göre mantıklı yap.
 - "correct_answer" değeri sadece doğru seçeneğin harfi olsun.
 - Kısa ve gerekçeli bir "explanation" ekle.
@@ -308,7 +532,7 @@ Sadece aşağıdaki JSON nesnesini döndür:
 
 JSON nesnesinin önüne veya arkasına başka metin ekleme."""
 
-            response = model.generate_content([
+            response = await model.generate_content_async([
                 prompt,
                 {
                     "mime_type": "image/jpeg",
@@ -318,32 +542,64 @@ JSON nesnesinin önüne veya arkasına başka metin ekleme."""
 
             response_text = response.text.strip()
             logging.info(
-                "AI response preview for image %s (page %s): %s...",
-                idx,
+                "AI response preview for page %s: %s...",
                 page_image["page_index"],
                 response_text[:200],
             )
 
-            if response_text.startswith("```"):
-                response_text = response_text.split("\n", 1)[1]
-                response_text = response_text.rsplit("```", 1)[0]
-
-            question_payload = json.loads(response_text)
+            question_payload = orjson.loads(_strip_markdown_fence(response_text))
 
             if isinstance(question_payload, list):
                 if not question_payload:
                     raise ValueError("Model returned an empty list for image-based question")
                 question_payload = question_payload[0]
 
-            question = Question(
+            # Store the image in GridFS and keep only its id on the question,
+            # so exam documents stay small and list responses skip the image.
+            # The file is stored under a uuid4 name rather than its ObjectId:
+            # ObjectIds embed a sequential counter and are enumerable, so they
+            # must not act as the capability for the unauthenticated image route
+            image_id = str(uuid.uuid4())
+            await fs_bucket.upload_from_stream(
+                image_id,
+                base64.b64decode(page_image["image_data"]),
+            )
+
+            return Question(
                 question_text=question_payload["question_text"],
                 question_type="image_based",
                 options=question_payload.get("options"),
                 correct_answer=question_payload["correct_answer"],
                 explanation=question_payload.get("explanation"),
-                image_data=page_image["image_data"],
+                image_data=image_id,
             )
-            questions.append(question)
+
+        # Pipeline: the producer renders pages into the queue while we fire
+        # a model request for each page as soon as it is available, so
+        # rasterization overlaps with the in-flight VLM calls.
+        render_q: asyncio.Queue = asyncio.Queue(maxsize=4)
+        producer = asyncio.create_task(_stream_page_images(pdf_path, num_questions, render_q))
+
+        vlm_tasks = []
+        try:
+            while True:
+                page_image = await render_q.get()
+                if page_image is None:
+                    break
+                vlm_tasks.append(asyncio.create_task(_question_for_page(page_image)))
+            await producer  # surface render errors
+        except BaseException:
+            for task in vlm_tasks:
+                task.cancel()
+            raise
+
+        results = await asyncio.gather(*vlm_tasks, return_exceptions=True)
+
+        questions: List[Question] = []
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+            questions.append(result)
 
         return questions
     except HTTPException:
@@ -352,50 +608,56 @@ JSON nesnesinin önüne veya arkasına başka metin ekleme."""
         logging.error(f"Error generating image-based exam: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to generate image-based exam: {str(e)}")
 
-async def generate_exam_with_ai(pdf_text: str, exam_type: str, difficulty: str, num_questions: int) -> List[Question]:
-    """Generate exam questions using AI"""
-    try:
-        # Configure Google AI
-        genai.configure(api_key=GOOGLE_AI_KEY)
-        
-        # Create prompt based on exam type
-        type_instruction = {
-            "multiple_choice": {
-                "instruction": "SADECE çoktan seçmeli sorular oluştur. Her soru için 5 seçenek (A, B, C, D, E) hazırla. Doğru cevap harfini belirt.",
-                "question_type": "multiple_choice"
-            },
-            "true_false": {
-                "instruction": "SADECE doğru/yanlış soruları oluştur. Cevap 'Doğru' veya 'Yanlış' olmalı.",
-                "question_type": "true_false"
-            },
-            "fill_blank": {
-                "instruction": "SADECE boşluk doldurma soruları oluştur. Boşluğu göstermek için '___' kullan. Doğru cevabı ver.",
-                "question_type": "fill_blank"
-            },
-            "open_ended": {
-                "instruction": "SADECE açık uçlu sorular oluştur. Detaylı cevaplar gerektiren sorular hazırla. Örnek doğru cevap ver.",
-                "question_type": "open_ended"
-            },
-            "mixed": {
-                "instruction": "Farklı türlerde sorular oluştur: çoktan seçmeli, doğru/yanlış, boşluk doldurma ve açık uçlu soruların karışımını yap.",
-                "question_type": "mixed"
-            }
-        }
-        
-        # Convert difficulty to Turkish
-        difficulty_turkish = {
-            "easy": "kolay",
-            "medium": "orta", 
-            "hard": "zor"
-        }.get(difficulty, difficulty)
-        
-        exam_instruction = type_instruction[exam_type]
-        
-        # Get random sections from PDF for more diverse questions
-        random_pdf_content = get_random_pdf_sections(pdf_text, num_sections=5)
-        
-        if exam_type == "mixed":
-            prompt = f"""Sen uzman bir sınav oluşturucususun. Verilen içeriğe dayalı olarak yüksek kaliteli sınav soruları oluştur.
+# Per-exam-type prompt instructions (Turkish, matching the generated exams)
+TYPE_INSTRUCTIONS = {
+    "multiple_choice": {
+        "instruction": "SADECE çoktan seçmeli sorular oluştur. Her soru için 5 seçenek (A, B, C, D, E) hazırla. Doğru cevap harfini belirt.",
+        "question_type": "multiple_choice"
+    },
+    "true_false": {
+        "instruction": "SADECE doğru/yanlış soruları oluştur. Cevap 'Doğru' veya 'Yanlış' olmalı.",
+        "question_type": "true_false"
+    },
+    "fill_blank": {
+        "instruction": "SADECE boşluk doldurma soruları oluştur. Boşluğu göstermek için '___' kullan. Doğru cevabı ver.",
+        "question_type": "fill_blank"
+    },
+    "open_ended": {
+        "instruction": "SADECE açık uçlu sorular oluştur. Detaylı cevaplar gerektiren sorular hazırla. Örnek doğru cevap ver.",
+        "question_type": "open_ended"
+    },
+    "mixed": {
+        "instruction": "Farklı türlerde sorular oluştur: çoktan seçmeli, doğru/yanlış, boşluk doldurma ve açık uçlu soruların karışımını yap.",
+        "question_type": "mixed"
+    }
+}
+
+DIFFICULTY_TURKISH = {
+    "easy": "kolay",
+    "medium": "orta",
+    "hard": "zor"
+}
+
+def _questions_from_payload(questions_data: List[dict]) -> List[Question]:
+    """Convert the model's parsed JSON array into Question objects."""
+    return [
+        Question(
+            question_text=q_data["question_text"],
+            question_type=q_data["question_type"],
+            options=q_data.get("options"),
+            correct_answer=q_data["correct_answer"],
+            explanation=q_data.get("explanation")
+        )
+        for q_data in questions_data
+    ]
+
+def _build_exam_prompt(exam_type: str, difficulty: str, num_questions: int, content_section: str) -> str:
+    """Build the question-generation prompt for a text-based exam."""
+    exam_instruction = TYPE_INSTRUCTIONS[exam_type]
+    difficulty_turkish = DIFFICULTY_TURKISH.get(difficulty, difficulty)
+
+    if exam_type == "mixed":
+        return f"""Sen uzman bir sınav oluşturucususun. Verilen içeriğe dayalı olarak yüksek kaliteli sınav soruları oluştur.
 
 Aşağıdaki içeriğe dayalı olarak {num_questions} adet {difficulty_turkish} zorluk seviyesinde sınav sorusu oluştur.
 
@@ -403,8 +665,7 @@ Aşağıdaki içeriğe dayalı olarak {num_questions} adet {difficulty_turkish}
 
 ÖNEMLİ: İçerikten farklı bölümlerden sorular oluştur. Her soru farklı bir konu veya kavramdan gelsin.
 
-İçerik:
-{random_pdf_content[:4000]}
+{content_section}
 
 ÖNEMLİ: Sadece aşağıdaki yapıda geçerli bir JSON dizisi döndür:
 [
@@ -418,8 +679,8 @@ Aşağıdaki içeriğe dayalı olarak {num_questions} adet {difficulty_turkish}
 ]
 
 JSON dizisinden önce veya sonra herhangi bir metin ekleme. Tüm soruları ve açıklamaları Türkçe dilinde oluştur."""
-        else:
-            prompt = f"""Sen uzman bir sınav oluşturucususun. Verilen içeriğe dayalı olarak yüksek kaliteli sınav soruları oluştur.
+
+    return f"""Sen uzman bir sınav oluşturucususun. Verilen içeriğe dayalı olarak yüksek kaliteli sınav soruları oluştur.
 
 Aşağıdaki içeriğe dayalı olarak {num_questions} adet {difficulty_turkish} zorluk seviyesinde sınav sorusu oluştur.
 
@@ -427,10 +688,9 @@ Aşağıdaki içeriğe dayalı olarak {num_questions} adet {difficulty_turkish}
 
 ÖNEMLİ: İçerikten farklı bölümlerden sorular oluştur. Her soru farklı bir konu veya kavramdan gelsin.
 
-İçerik:
-{random_pdf_content[:4000]}
+{content_section}
 
-ÖNEMLİ: 
+ÖNEMLİ:
 - TÜM sorular {exam_instruction["question_type"]} türünde olmalı
 - Sadece aşağıdaki yapıda geçerli bir JSON dizisi döndür:
 [
@@ -446,90 +706,197 @@ Aşağıdaki içeriğe dayalı olarak {num_questions} adet {difficulty_turkish}
 JSON dizisinden önce veya sonra herhangi bir metin ekleme.
 Her soru için question_type alanını "{exam_instruction["question_type"]}" olarak ayarla.
 Tüm soruları ve açıklamaları Türkçe dilinde oluştur."""
-        
+
+# Chunking parameters for spreading generation over long documents
+_CHUNK_SIZE = 3500
+_CHUNK_OVERLAP = 200
+_MAX_CHUNKS = 4
+
+def _split_text_into_chunks(text: str, chunk_size: int = _CHUNK_SIZE, overlap: int = _CHUNK_OVERLAP) -> List[str]:
+    """Split text into fixed-size chunks with a small overlap."""
+    chunks = []
+    start = 0
+    while start < len(text):
+        chunks.append(text[start:start + chunk_size])
+        if start + chunk_size >= len(text):
+            break
+        start += chunk_size - overlap
+    return chunks
+
+async def _generate_chunked_exam(pdf_text: str, exam_type: str, difficulty: str, num_questions: int) -> List[Question]:
+    """Generate questions with concurrent calls over different document chunks.
+
+    Covers the whole document instead of one 4000-char slice, and the
+    concurrent calls finish in roughly one round-trip time.
+    """
+    chunks = _split_text_into_chunks(pdf_text)
+    if len(chunks) > _MAX_CHUNKS:
+        # Sample evenly so a bounded number of calls still spans the document
+        step = len(chunks) / _MAX_CHUNKS
+        chunks = [chunks[int(i * step)] for i in range(_MAX_CHUNKS)]
+
+    per_chunk = -(-num_questions // len(chunks))  # ceil
+    model = _get_gemini_model()
+
+    async def _questions_for_chunk(chunk: str) -> List[Question]:
+        prompt = _build_exam_prompt(exam_type, difficulty, per_chunk, f"İçerik:\n{chunk}")
+        response = await model.generate_content_async(prompt, generation_config=_QUESTIONS_GENERATION_CONFIG)
+        questions_data = orjson.loads(_strip_markdown_fence(response.text.strip()))
+        return _questions_from_payload(questions_data)
+
+    results = await asyncio.gather(*(_questions_for_chunk(chunk) for chunk in chunks))
+    questions = [question for chunk_questions in results for question in chunk_questions]
+    return questions[:num_questions]
+
+async def generate_exam_with_ai(pdf_text: str, exam_type: str, difficulty: str, num_questions: int) -> List[Question]:
+    """Generate exam questions using AI"""
+    try:
+        # Reuse a cached context for this document when available; otherwise
+        # embed random sections from the PDF for more diverse questions
+        context_cache = await _get_context_cache(pdf_text)
+        if context_cache is not None:
+            content_section = "İçerik: Sana önceden sağlanan belge içeriğini kullan."
+        elif len(pdf_text) > _CHUNK_SIZE:
+            # No cached context for a long document: spread concurrent calls
+            # over chunks so the whole document is covered
+            return await _generate_chunked_exam(pdf_text, exam_type, difficulty, num_questions)
+        else:
+            random_pdf_content = get_random_pdf_sections(pdf_text, num_sections=5)
+            content_section = f"İçerik:\n{random_pdf_content[:4000]}"
+
+        prompt = _build_exam_prompt(exam_type, difficulty, num_questions, content_section)
+
         # Generate content using Gemini
-        # First, let's try to list available models for debugging
-        try:
-            models = genai.list_models()
-            logging.info(f"Available models: {[m.name for m in models]}")
-        except Exception as e:
-            logging.warning(f"Could not list models: {e}")
-        
-        # Try different model names (using the available models from the logs)
-        model_names_to_try = ['gemini-2.5-pro', 'gemini-2.5-flash', 'gemini-2.0-flash', 'gemini-pro-latest']
-        model = None
-        
-        for model_name in model_names_to_try:
-            try:
-                model = genai.GenerativeModel(model_name)
-                logging.info(f"Successfully created model: {model_name}")
-                break
-            except Exception as e:
-                logging.warning(f"Failed to create model {model_name}: {e}")
-                continue
-        
-        if not model:
-            raise HTTPException(status_code=500, detail="No available Gemini models found")
-        
+        if context_cache is not None:
+            model = genai.GenerativeModel.from_cached_content(cached_content=context_cache)
+        else:
+            model = _get_gemini_model()
+
         # Log the exam type and prompt for debugging
         logging.info(f"Creating exam with type: {exam_type}")
-        logging.info(f"Question type constraint: {exam_instruction['question_type']}")
         logging.info(f"Prompt preview: {prompt[:300]}...")
-        
-        response = model.generate_content(prompt)
+
+        response = await model.generate_content_async(prompt, generation_config=_QUESTIONS_GENERATION_CONFIG)
         response_text = response.text.strip()
-        
+
         logging.info(f"AI response preview: {response_text[:300]}...")
-        
+
         # Parse response
-        import json
-        # Remove markdown code blocks if present
-        if response_text.startswith("```"):
-            response_text = response_text.split("\n", 1)[1]
-            response_text = response_text.rsplit("```", 1)[0]
-        
-        questions_data = json.loads(response_text)
-        
+        questions_data = orjson.loads(_strip_markdown_fence(response_text))
+
         # Log the question types generated
         question_types = [q.get("question_type") for q in questions_data]
         logging.info(f"Generated question types: {question_types}")
-        
-        # Convert to Question objects
-        questions = []
-        for q_data in questions_data:
-            question = Question(
-                question_text=q_data["question_text"],
-                question_type=q_data["question_type"],
-                options=q_data.get("options"),
-                correct_answer=q_data["correct_answer"],
-                explanation=q_data.get("explanation")
-            )
-            questions.append(question)
-        
-        return questions
+
+        return _questions_from_payload(questions_data)
     except Exception as e:
         logging.error(f"Error generating exam: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to generate exam: {str(e)}")
 
+# Gemini Batch Mode job states that mean the job is finished
+_BATCH_FINISHED_STATES = {"JOB_STATE_SUCCEEDED", "JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+_BATCH_POLL_INTERVAL = 30  # seconds
+
+def _get_batch_client():
+    """Client for the google-genai SDK, which exposes Batch Mode."""
+    from google import genai as google_genai
+
+    return google_genai.Client(api_key=GOOGLE_AI_KEY)
+
+# Strong references to background pollers: the event loop only keeps weak
+# references to tasks, so without this a poller could be garbage-collected
+# mid-job and leave its batch stuck at "pending"
+_BACKGROUND_TASKS: set = set()
+
+def _spawn_background_task(coro) -> None:
+    """Run a coroutine as a task that survives until it finishes."""
+    task = asyncio.create_task(coro)
+    _BACKGROUND_TASKS.add(task)
+    task.add_done_callback(_BACKGROUND_TASKS.discard)
+
+async def _finalize_batch_job(pending_id: str, batch_job) -> str:
+    """Materialize the exams of a finished batch job; returns the final status.
+
+    Atomically claims the pending document first, so a poller and a status
+    request that both observe the finished job cannot materialize it twice.
+    """
+    pending = await db.pending_exams.find_one_and_update(
+        {"id": pending_id, "status": "pending"},
+        {"$set": {"status": "finalizing"}},
+        projection={"_id": 0},
+    )
+    if pending is None:
+        current = await db.pending_exams.find_one({"id": pending_id}, {"_id": 0, "status": 1})
+        return current["status"] if current else "failed"
+
+    if batch_job.state.name != "JOB_STATE_SUCCEEDED":
+        logging.error(f"Batch job {pending['batch_name']} finished in state {batch_job.state.name}")
+        await db.pending_exams.update_one({"id": pending_id}, {"$set": {"status": "failed"}})
+        return "failed"
+
+    created = 0
+    responses = batch_job.dest.inlined_responses or []
+    for entry, inlined in zip(pending["entries"], responses):
+        try:
+            response_text = inlined.response.text.strip()
+            questions_data = orjson.loads(_strip_markdown_fence(response_text))
+            exam = Exam(
+                id=entry["exam_id"],
+                user_id=pending["user_id"],
+                title=f"Exam from {entry['pdf_name']}",
+                exam_type=pending["exam_type"],
+                difficulty=pending["difficulty"],
+                questions=_questions_from_payload(questions_data),
+                pdf_name=entry["pdf_name"],
+            )
+            await db.exams.insert_one(exam.model_dump())
+            created += 1
+        except Exception as e:
+            logging.error(f"Failed to materialize exam {entry['exam_id']} from batch {pending['batch_name']}: {str(e)}")
+
+    await db.pending_exams.update_one(
+        {"id": pending_id},
+        {"$set": {"status": "completed", "created_exams": created}},
+    )
+    return "completed"
+
+async def _poll_batch_job(pending_id: str, batch_name: str) -> None:
+    """Poll a Gemini batch job and materialize its exams on completion."""
+    batch_client = _get_batch_client()
+    try:
+        while True:
+            await asyncio.sleep(_BATCH_POLL_INTERVAL)
+            batch_job = await asyncio.to_thread(batch_client.batches.get, name=batch_name)
+            if batch_job.state.name in _BATCH_FINISHED_STATES:
+                break
+
+        await _finalize_batch_job(pending_id, batch_job)
+    except Exception as e:
+        logging.error(f"Error polling batch job {batch_name}: {str(e)}")
+        await db.pending_exams.update_one(
+            {"id": pending_id, "status": {"$ne": "completed"}},
+            {"$set": {"status": "failed"}},
+        )
+
 # Routes
 @api_router.post("/auth/register", response_model=dict)
 async def register(user_data: UserCreate):
-    # Check if user exists
-    existing_user = await db.users.find_one({"email": user_data.email})
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
     # Create user
     user = User(
         email=user_data.email,
         full_name=user_data.full_name
     )
-    
+
     user_doc = user.model_dump()
-    user_doc["password_hash"] = hash_password(user_data.password)
-    user_doc["created_at"] = user_doc["created_at"].isoformat()
-    
-    await db.users.insert_one(user_doc)
+    # bcrypt is CPU-heavy by design; run it off the event loop
+    user_doc["password_hash"] = await asyncio.to_thread(hash_password, user_data.password)
+
+    # The unique email index enforces uniqueness atomically, so no separate
+    # existence check round-trip
+    try:
+        await db.users.insert_one(user_doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
     
     # Create token
     token = create_access_token({"sub": user.id})
@@ -546,9 +913,16 @@ async def register(user_data: UserCreate):
 @api_router.post("/auth/login", response_model=dict)
 async def login(credentials: UserLogin):
     user = await db.users.find_one({"email": credentials.email}, {"_id": 0})
-    if not user or not verify_password(credentials.password, user["password_hash"]):
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
-    
+
+    cache_key = hashlib.sha256(f"{credentials.email}:{credentials.password}".encode()).digest()
+    if cache_key not in _LOGIN_CACHE:
+        # bcrypt is CPU-heavy by design; run it off the event loop
+        if not await asyncio.to_thread(verify_password, credentials.password, user["password_hash"]):
+            raise HTTPException(status_code=401, detail="Invalid email or password")
+        _LOGIN_CACHE[cache_key] = True
+
     token = create_access_token({"sub": user["id"]})
     
     return {
@@ -576,19 +950,24 @@ async def create_exam(
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
     
     # Save PDF temporarily
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-        content = await pdf.read()
-        tmp_file.write(content)
-        tmp_path = tmp_file.name
-    
+    # Stream the upload to disk in 1 MiB chunks so memory stays constant
+    # regardless of the PDF size
+    tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
+    try:
+        while chunk := await pdf.read(1024 * 1024):
+            await asyncio.to_thread(tmp_file.write, chunk)
+    finally:
+        tmp_file.close()
+    tmp_path = tmp_file.name
+
     try:
         # Check if image-based exam
         if exam_type == "image_based":
             # Generate image-based questions directly from PDF
             questions = await generate_image_based_exam(tmp_path, difficulty, num_questions)
         else:
-            # Extract text from PDF
-            pdf_text = extract_text_from_pdf(tmp_path)
+            # Extract text from PDF (CPU-bound, run off the event loop)
+            pdf_text = await asyncio.to_thread(extract_text_from_pdf, tmp_path)
             
             if not pdf_text.strip():
                 raise HTTPException(status_code=400, detail="Could not extract text from PDF")
@@ -606,10 +985,10 @@ async def create_exam(
             pdf_name=pdf.filename
         )
         
+        # model_dump() already recursed into the nested Question list, and
+        # BSON stores the datetime natively
         exam_doc = exam.model_dump()
-        exam_doc["created_at"] = exam_doc["created_at"].isoformat()
-        exam_doc["questions"] = [q.model_dump() for q in questions]
-        
+
         await db.exams.insert_one(exam_doc)
         
         return exam
@@ -617,15 +996,130 @@ async def create_exam(
         # Clean up temporary file
         os.unlink(tmp_path)
 
-@api_router.get("/exams", response_model=List[Exam])
-async def get_exams(current_user: dict = Depends(get_current_user)):
-    exams = await db.exams.find({"user_id": current_user["id"]}, {"_id": 0}).to_list(1000)
-    
-    for exam in exams:
-        if isinstance(exam["created_at"], str):
-            exam["created_at"] = datetime.fromisoformat(exam["created_at"])
-    
-    return exams
+@api_router.post("/exams/create_batch", response_model=dict)
+async def create_exam_batch(
+    pdfs: List[UploadFile] = File(...),
+    exam_type: str = Form("mixed"),
+    difficulty: str = Form("medium"),
+    num_questions: int = Form(10),
+    current_user: dict = Depends(get_current_user)
+):
+    """Queue exam generation for several PDFs through Gemini Batch Mode.
+
+    Batch Mode costs roughly half as much as interactive calls and avoids
+    per-minute rate limits; the generated exams appear in the exams
+    collection once the job completes.
+    """
+    if exam_type == "image_based":
+        raise HTTPException(status_code=400, detail="Batch creation supports text-based exam types only")
+
+    batch_requests = []
+    entries = []
+    for pdf in pdfs:
+        if not pdf.filename.endswith('.pdf'):
+            raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+
+        tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
+        try:
+            while chunk := await pdf.read(1024 * 1024):
+                await asyncio.to_thread(tmp_file.write, chunk)
+            tmp_file.close()
+            pdf_text = await asyncio.to_thread(extract_text_from_pdf, tmp_file.name)
+        finally:
+            tmp_file.close()
+            os.unlink(tmp_file.name)
+
+        if not pdf_text.strip():
+            raise HTTPException(status_code=400, detail=f"Could not extract text from {pdf.filename}")
+
+        content_section = f"İçerik:\n{get_random_pdf_sections(pdf_text, num_sections=5)[:4000]}"
+        prompt = _build_exam_prompt(exam_type, difficulty, num_questions, content_section)
+        batch_requests.append({"contents": [{"parts": [{"text": prompt}], "role": "user"}]})
+        entries.append({"exam_id": str(uuid.uuid4()), "pdf_name": pdf.filename})
+
+    batch_client = _get_batch_client()
+    try:
+        batch_job = await asyncio.to_thread(
+            batch_client.batches.create,
+            model="gemini-2.5-flash",
+            src=batch_requests,
+        )
+    except Exception as e:
+        logging.error(f"Failed to create batch job: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to create batch job: {str(e)}")
+
+    batch_id = str(uuid.uuid4())
+    await db.pending_exams.insert_one({
+        "id": batch_id,
+        "user_id": current_user["id"],
+        "batch_name": batch_job.name,
+        "exam_type": exam_type,
+        "difficulty": difficulty,
+        "entries": entries,
+        "status": "pending",
+        "created_at": datetime.now(timezone.utc),
+    })
+
+    _spawn_background_task(_poll_batch_job(batch_id, batch_job.name))
+
+    return {
+        "batch_id": batch_id,
+        "status": "pending",
+        "exam_ids": [entry["exam_id"] for entry in entries]
+    }
+
+@api_router.get("/exams/batch/{batch_id}", response_model=dict)
+async def get_exam_batch(batch_id: str, current_user: dict = Depends(get_current_user)):
+    """Report the status of a batch exam-generation job."""
+    pending = await db.pending_exams.find_one({"id": batch_id, "user_id": current_user["id"]}, {"_id": 0})
+
+    if not pending:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    batch_status = pending["status"]
+    if batch_status == "pending":
+        # A restart loses the in-process poller, which would strand the job at
+        # "pending" forever; re-check the job directly and finalize if it is done
+        try:
+            batch_client = _get_batch_client()
+            batch_job = await asyncio.to_thread(batch_client.batches.get, name=pending["batch_name"])
+            if batch_job.state.name in _BATCH_FINISHED_STATES:
+                batch_status = await _finalize_batch_job(batch_id, batch_job)
+        except Exception as e:
+            logging.warning(f"Could not refresh batch job {pending['batch_name']}: {str(e)}")
+
+    return {
+        "batch_id": batch_id,
+        "status": batch_status,
+        "exam_ids": [entry["exam_id"] for entry in pending["entries"]]
+    }
+
+@api_router.get("/exams", response_model=None)
+async def get_exams(skip: int = Query(0, ge=0), limit: int = Query(20, ge=1, le=100), current_user: dict = Depends(get_current_user)) -> List[ExamSummary]:
+    # Project the questions array (which can embed Base64 images) down to
+    # its size server-side; the detail endpoint returns the full exam
+    cursor = await db.exams.aggregate([
+        {"$match": {"user_id": current_user["id"]}},
+        {"$sort": {"created_at": -1}},
+        {"$skip": skip},
+        {"$limit": limit},
+        {"$project": {
+            "_id": 0,
+            "id": 1,
+            "user_id": 1,
+            "title": 1,
+            "exam_type": 1,
+            "difficulty": 1,
+            "pdf_name": 1,
+            "created_at": 1,
+            "question_count": {"$size": {"$ifNull": ["$questions", []]}},
+        }},
+    ])
+    exams = await cursor.to_list(limit)
+
+    # These documents were written by this app and have known-good shape, so
+    # skip Pydantic's per-field response validation with model_construct
+    return [ExamSummary.model_construct(**exam) for exam in exams]
 
 @api_router.get("/exams/{exam_id}", response_model=Exam)
 async def get_exam(exam_id: str, current_user: dict = Depends(get_current_user)):
@@ -633,51 +1127,89 @@ async def get_exam(exam_id: str, current_user: dict = Depends(get_current_user))
     
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
-    
-    if isinstance(exam["created_at"], str):
-        exam["created_at"] = datetime.fromisoformat(exam["created_at"])
-    
+
     return exam
 
+async def _delete_question_image(image_id: str) -> None:
+    """Delete a question image from GridFS; tolerates already-missing files."""
+    try:
+        if len(image_id) == 24:
+            # Image stored before the switch to uuid4 filenames
+            await fs_bucket.delete(ObjectId(image_id))
+        else:
+            async for grid_file in fs_bucket.find({"filename": image_id}):
+                await fs_bucket.delete(grid_file._id)
+    except Exception as e:
+        logging.warning(f"Could not delete question image {image_id}: {str(e)}")
+
 @api_router.delete("/exams/{exam_id}")
 async def delete_exam(exam_id: str, current_user: dict = Depends(get_current_user)):
     """Delete an exam"""
-    # Check if exam exists and belongs to user
-    exam = await db.exams.find_one({"id": exam_id, "user_id": current_user["id"]}, {"_id": 0})
-    
-    if not exam:
-        raise HTTPException(status_code=404, detail="Exam not found")
-    
-    # Delete the exam
-    result = await db.exams.delete_one({"id": exam_id, "user_id": current_user["id"]})
-    
-    if result.deleted_count == 0:
+    # Fetch the image ids up front so the GridFS files die with the exam;
+    # otherwise they would linger and stay fetchable via /images/{id}.
+    # Inline Base64 images from old exams are skipped by the length check
+    exam = await db.exams.find_one(
+        {"id": exam_id, "user_id": current_user["id"]},
+        {"_id": 0, "questions.image_data": 1},
+    )
+    if exam is None:
         raise HTTPException(status_code=404, detail="Exam not found")
-    
-    # Also delete related exam results
-    await db.exam_results.delete_many({"exam_id": exam_id})
-    
+
+    image_ids = [
+        question["image_data"]
+        for question in exam.get("questions", [])
+        if question.get("image_data") and len(question["image_data"]) <= 36
+    ]
+
+    # The results cascade is scoped to the caller so it cannot touch
+    # another user's results
+    await asyncio.gather(
+        db.exams.delete_one({"id": exam_id, "user_id": current_user["id"]}),
+        db.exam_results.delete_many({"exam_id": exam_id, "user_id": current_user["id"]}),
+        *[_delete_question_image(image_id) for image_id in image_ids],
+    )
+
     return {"message": "Exam deleted successfully"}
 
-@api_router.post("/exams/submit", response_model=ExamResult)
-async def submit_exam(submission: ExamSubmission, current_user: dict = Depends(get_current_user)):
-    # Get exam
-    exam = await db.exams.find_one({"id": submission.exam_id, "user_id": current_user["id"]}, {"_id": 0})
-    
-    if not exam:
-        raise HTTPException(status_code=404, detail="Exam not found")
-    
-    # Evaluate answers
+@api_router.get("/images/{image_id}")
+async def get_image(image_id: str):
+    """Stream a question image stored in GridFS."""
+    # No auth dependency: <img> tags cannot attach bearer headers. The uuid4
+    # filename is the capability — unlike an ObjectId (which embeds a
+    # sequential counter and is enumerable) it cannot be derived from another
+    # id. ObjectId lookup is kept only for images stored before the switch.
+    try:
+        if len(image_id) == 24:
+            stream = await fs_bucket.open_download_stream(ObjectId(image_id))
+        else:
+            stream = await fs_bucket.open_download_stream_by_name(image_id)
+    except Exception:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    async def iter_chunks():
+        while True:
+            chunk = await stream.readchunk()
+            if not chunk:
+                break
+            yield chunk
+
+    return StreamingResponse(iter_chunks(), media_type="image/jpeg")
+
+def _score_submission(exam: dict, submission: ExamSubmission, user_id: str) -> ExamResult:
+    """Score a submission against its exam and build the result."""
     correct_count = 0
     feedback = []
-    
+    questions_by_id = {q["id"]: q for q in exam["questions"]}
+    # Normalize each correct answer once, not per submitted answer
+    normalized_answers = {q["id"]: q["correct_answer"].strip().lower() for q in exam["questions"]}
+
     for answer in submission.answers:
-        question = next((q for q in exam["questions"] if q["id"] == answer.question_id), None)
+        question = questions_by_id.get(answer.question_id)
         if question:
-            is_correct = answer.user_answer.strip().lower() == question["correct_answer"].strip().lower()
+            is_correct = answer.user_answer.strip().lower() == normalized_answers[answer.question_id]
             if is_correct:
                 correct_count += 1
-            
+
             feedback.append({
                 "question_id": answer.question_id,
                 "is_correct": is_correct,
@@ -685,37 +1217,72 @@ async def submit_exam(submission: ExamSubmission, current_user: dict = Depends(g
                 "user_answer": answer.user_answer,
                 "explanation": question.get("explanation", "")
             })
-    
+
     total_questions = len(exam["questions"])
     score = (correct_count / total_questions) * 100 if total_questions > 0 else 0
-    
-    # Save result
-    result = ExamResult(
+
+    return ExamResult(
         exam_id=submission.exam_id,
-        user_id=current_user["id"],
+        user_id=user_id,
         score=score,
         total_questions=total_questions,
         correct_answers=correct_count,
         answers=submission.answers,
         feedback=feedback
     )
-    
-    result_doc = result.model_dump()
-    result_doc["submitted_at"] = result_doc["submitted_at"].isoformat()
-    result_doc["answers"] = [a.model_dump() for a in submission.answers]
-    
-    await db.exam_results.insert_one(result_doc)
-    
+
+@api_router.post("/exams/submit", response_model=ExamResult)
+async def submit_exam(submission: ExamSubmission, current_user: dict = Depends(get_current_user)):
+    # Get exam
+    exam = await db.exams.find_one({"id": submission.exam_id, "user_id": current_user["id"]}, {"_id": 0})
+
+    if not exam:
+        raise HTTPException(status_code=404, detail="Exam not found")
+
+    result = _score_submission(exam, submission, current_user["id"])
+
+    # model_dump() already recursed into the nested answer list, and BSON
+    # stores the datetime natively
+    await db.exam_results.insert_one(result.model_dump())
+
     return result
 
+@api_router.post("/exams/submit_batch", response_model=List[ExamResult])
+async def submit_exam_batch(submissions: List[ExamSubmission], current_user: dict = Depends(get_current_user)):
+    """Score several submissions and persist them with one bulk insert."""
+    if not submissions:
+        return []
+
+    # Fetch each referenced exam once, even when submissions share it
+    exam_ids = list({submission.exam_id for submission in submissions})
+    exams = await db.exams.find(
+        {"id": {"$in": exam_ids}, "user_id": current_user["id"]}, {"_id": 0}
+    ).to_list(len(exam_ids))
+    exams_by_id = {exam["id"]: exam for exam in exams}
+
+    results = []
+    for submission in submissions:
+        exam = exams_by_id.get(submission.exam_id)
+        if not exam:
+            raise HTTPException(status_code=404, detail=f"Exam {submission.exam_id} not found")
+        results.append(_score_submission(exam, submission, current_user["id"]))
+
+    # ordered=False lets the server apply the inserts in parallel
+    await db.exam_results.insert_many([result.model_dump() for result in results], ordered=False)
+
+    return results
+
 @api_router.get("/results", response_model=List[ExamResult])
-async def get_results(current_user: dict = Depends(get_current_user)):
-    results = await db.exam_results.find({"user_id": current_user["id"]}, {"_id": 0}).to_list(1000)
-    
-    for result in results:
-        if isinstance(result["submitted_at"], str):
-            result["submitted_at"] = datetime.fromisoformat(result["submitted_at"])
-    
+async def get_results(skip: int = Query(0, ge=0), limit: int = Query(20, ge=1, le=100), current_user: dict = Depends(get_current_user)):
+    # Per-answer detail is served by the result detail endpoint
+    results = await (
+        db.exam_results.find({"user_id": current_user["id"]}, {"_id": 0, "answers": 0, "feedback": 0})
+        .sort("submitted_at", -1)
+        .skip(skip)
+        .limit(limit)
+        .to_list(limit)
+    )
+
     return results
 
 @api_router.get("/results/{result_id}", response_model=ExamResult)
@@ -724,10 +1291,7 @@ async def get_result(result_id: str, current_user: dict = Depends(get_current_us
     
     if not result:
         raise HTTPException(status_code=404, detail="Result not found")
-    
-    if isinstance(result["submitted_at"], str):
-        result["submitted_at"] = datetime.fromisoformat(result["submitted_at"])
-    
+
     return result
 
 # Include router
@@ -747,6 +1311,30 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def configure_genai():
+    """Configure the Gemini SDK once instead of on every request."""
+    if GOOGLE_AI_KEY:
+        genai.configure(api_key=GOOGLE_AI_KEY)
+
+@app.on_event("startup")
+async def prewarm_mongo_pool():
+    """Establish connections up front so the first request avoids the spike."""
+    await db.command("ping")
+
+@app.on_event("startup")
+async def create_db_indexes():
+    """Create the indexes backing the hot query paths."""
+    await db.users.create_index("email", unique=True)
+    await db.exams.create_index("id", unique=True)
+    await db.exams.create_index([("user_id", 1), ("id", 1)], unique=True)
+    await db.exams.create_index([("user_id", 1), ("created_at", -1)])
+    await db.exam_results.create_index("id", unique=True)
+    await db.exam_results.create_index([("user_id", 1), ("id", 1)], unique=True)
+    # Used by delete_exam's cascade delete of results
+    await db.exam_results.create_index("exam_id")
+    await db.pending_exams.create_index("id", unique=True)
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    await client.close()
\ No newline at end of file
@@ -208,7 +208,7 @@ export default function Dashboard() {
                     </div>
                     <CardTitle className="text-lg line-clamp-2">{exam.title}</CardTitle>
                     <CardDescription>
-                      {getExamTypeLabel(exam.exam_type)} • {exam.questions?.length || 0} Soru
+                      {getExamTypeLabel(exam.exam_type)} • {exam.question_count ?? exam.questions?.length ?? 0} Soru
                     </CardDescription>
                   </CardHeader>
                   <CardContent>
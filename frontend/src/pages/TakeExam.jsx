@@ -202,7 +202,9 @@ export default function TakeExam() {
                     {question.image_data && (
                       <div className="flex justify-center">
                         <img 
-                          src={`data:image/jpeg;base64,${question.image_data}`}
+                          src={question.image_data.length <= 36
+                            ? `${API}/images/${question.image_data}`
+                            : `data:image/jpeg;base64,${question.image_data}`}
                           alt="Soru görseli"
                           className="max-w-full h-auto rounded-lg shadow-md border"
                           style={{ maxHeight: '400px' }}